@@ -0,0 +1,926 @@
+"""
+Benchmark lazy tensors (torch/csrc/lazy, via the lazy_tensor_core frontend)
+against eager execution, using TorchBench models plus a couple of toy models,
+and report per-op tracing overhead as well as amortized/unamortized compute
+speedups.
+
+Requires the `lazy_tensor_core` package and (for the full model set) a
+checkout of https://github.com/pytorch/benchmark on sys.path.
+
+e.g. python lazy_bench.py -d cuda -k HardSwish
+"""
+import argparse
+import atexit
+import csv
+import functools
+import gc
+import io
+import itertools
+import logging
+import math
+import os
+import re
+import statistics
+import sys
+import time
+from os.path import abspath, exists
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils._pytree import tree_map
+
+import lazy_tensor_core
+import lazy_tensor_core.core.lazy_model as ltm
+import lazy_tensor_core.debug.metrics as metrics
+
+lazy_tensor_core._LAZYC._ltc_init_ts_backend()
+
+log = logging.getLogger(__name__)
+
+# name of the model currently being benchmarked, and the eager device it is
+# being compared on; set by iter_models for use in logging and csv output
+current_name = ""
+current_device = ""
+
+# models that are known broken under lazy tensors (or in torchbench itself)
+SKIP = {
+    "speech_transformer",  # no eval() implementation
+    "mobilenet_v2_quantized_qat",
+    "hf_Reformer",
+}
+
+# models that only work in eval mode; toy models register themselves here
+# since they have no training loop
+SKIP_TRAIN_ONLY = {
+    "squeezenet1_1",
+    "demucs",
+}
+
+
+def set_seeds(seed=1337):
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    if torch.cuda.is_available():
+        torch.cuda.manual_seed_all(seed)
+
+
+@functools.lru_cache(maxsize=None)
+def get_unique_suffix():
+    return f"{time.time()}_{os.getpid()}"
+
+
+# how many rows to buffer before forcing them to disk; settable via
+# --flush_every for crash safety vs. syscall overhead
+csv_flush_every = 64
+
+
+class CsvOutput:
+    """Buffered csv writer: an unbuffered stream costs a write syscall per
+    row, which can land inside a timed region. Rows are flushed every
+    csv_flush_every writes and unconditionally at interpreter exit."""
+
+    def __init__(self, name, headers):
+        self.stream = io.TextIOWrapper(open(name, "wb", buffering=8192), "utf-8")
+        self.writer = csv.writer(self.stream)
+        self.rows_written = 0
+        atexit.register(self.stream.flush)
+        self.writer.writerow(headers)
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        self.rows_written += 1
+        if self.rows_written % csv_flush_every == 0:
+            self.stream.flush()
+
+
+@functools.lru_cache(None)
+def output_csv(name, headers):
+    return CsvOutput(name, headers)
+
+
+def short_name(name, limit=20):
+    """Truncate a model name for aligned console output."""
+    return name if len(name) <= limit else f"{name[:limit - 3].rstrip()}..."
+
+
+def welch_ttest(a, b):
+    """Two-sided Welch's t-test p-value, via the normal approximation.
+
+    scipy.stats.ttest_ind costs ~500ms of import at startup and its
+    Python-level overhead dwarfs the arithmetic on repeat~6 samples; the
+    normal approximation of the t distribution is plenty at the p<0.05
+    granularity these experiments report.
+    """
+    if len(a) < 2 or len(b) < 2:
+        # no variance from a single sample; scipy returned nan here too
+        return math.nan
+    mean_a, mean_b = statistics.mean(a), statistics.mean(b)
+    var_a, var_b = statistics.variance(a), statistics.variance(b)
+    denom = math.sqrt(var_a / len(a) + var_b / len(b))
+    if denom == 0:
+        return 1.0
+    t = (mean_a - mean_b) / denom
+    return math.erfc(abs(t) / math.sqrt(2))
+
+
+# scripted so the fuser (selected by --fuser) collapses the pointwise chain
+# into one kernel: written naively, each op launches its own kernel and
+# streams the whole tensor through HBM. The arithmetic form is kept (rather
+# than calling F.hardswish) so the lazy trace still sees the same op
+# sequence that real unfused model code produces.
+@torch.jit.script
+def _hardswish_fused(x):
+    return x * torch.clamp(x + 3.0, 0.0, 6.0) / 6.0
+
+
+@torch.jit.script
+def _div_add_mul_fused(inputs, mask, scale: float):
+    out1 = inputs * scale
+    out2 = out1 + mask
+    out3 = out2 * 5.0
+    return out3
+
+
+class HardSwish(nn.Module):
+    def forward(self, x):
+        return _hardswish_fused(x)
+
+
+class DivAddMul(nn.Module):
+    """Mimics the unfused scale/mask pointwise chain from BERT attention."""
+
+    def __init__(self, attention_head_size):
+        super(DivAddMul, self).__init__()
+        self.attention_head_size = float(attention_head_size)
+        # hoist the sqrt out of forward and multiply by the reciprocal:
+        # a scalar mul is cheaper than a div on every backend
+        self.scale = 1.0 / math.sqrt(self.attention_head_size)
+
+    def forward(self, inputs, mask):
+        return _div_add_mul_fused(inputs, mask, self.scale)
+
+
+# rebuilding a toy benchmark for a shape already seen reuses the cached
+# tensor instead of re-paying cudaMalloc (512MB for the largest toy shape)
+@functools.lru_cache(maxsize=None)
+def _toy_input(dims, device, dtype):
+    return torch.randn(*dims, device=device, dtype=dtype)
+
+
+@functools.lru_cache(maxsize=None)
+def _toy_mask(dims, device, dtype):
+    return torch.ones(*dims, device=device, dtype=dtype)
+
+
+class HardSwishBenchmark:
+    def __init__(self, device, jit, dims):
+        self.name = "HardSwish[" + ",".join(map(str, dims)) + "]"
+        self.device = device
+        self.jit = jit
+        self.model = HardSwish().to(device)
+        self.example_inputs = (_toy_input(tuple(dims), device, torch.float32),)
+
+    def get_module(self):
+        return self.model, self.example_inputs
+
+
+class DivAddMulBenchmark:
+    """The setting of attention_head_size is vital to matching the shapes
+    used by the attention layers in BERT."""
+
+    def __init__(self, device, jit, dims):
+        self.name = "DivAddMul[" + ",".join(map(str, dims)) + "]"
+        self.device = device
+        self.jit = jit
+        self.model = DivAddMul(attention_head_size=dims[1]).to(device)
+        self.example_inputs = (
+            _toy_input(tuple(dims), device, torch.float32),
+            _toy_mask(tuple(dims), device, torch.float32),
+        )
+
+    def get_module(self):
+        return self.model, self.example_inputs
+
+
+def _make_toy_benchmarks():
+    toys = []
+    for benchmark_cls in (HardSwishBenchmark, DivAddMulBenchmark):
+        for dims in ((1, 1, 1, 1), (32, 16, 128, 128), (256, 16, 128, 128)):
+            toy = functools.partial(benchmark_cls, dims=dims)
+            toy.name = benchmark_cls.__name__[: -len("Benchmark")] \
+                + "[" + ",".join(map(str, dims)) + "]"
+            # toy models are defined for eval only
+            SKIP_TRAIN_ONLY.add(toy.name)
+            toys.append(toy)
+    return tuple(toys)
+
+
+_TOY_BENCHMARKS = _make_toy_benchmarks()
+
+
+def list_toy_models():
+    return _TOY_BENCHMARKS
+
+
+def iter_models(args):
+    from torchbenchmark import list_models
+
+    filter_re = re.compile("|".join(args.filter), re.I) if args.filter else None
+    exclude_re = re.compile("|".join(args.exclude), re.I) if args.exclude else None
+    for benchmark_cls in itertools.chain(list_models(), list_toy_models()):
+        name = benchmark_cls.name
+        if (filter_re and not filter_re.search(name)) or (
+                exclude_re and exclude_re.search(name)):
+            continue
+        if name in SKIP:
+            continue
+        if args.test == "train" and name in SKIP_TRAIN_ONLY:
+            continue
+        device = args.device
+        try:
+            set_seeds()
+            benchmark = benchmark_cls(device=device, jit=False)
+            set_seeds()
+            lazy_benchmark = benchmark_cls(device="lazy", jit=False)
+            # reclaim the previous model before timing anything for this
+            # one; gen-0 only, since everything long-lived was frozen at
+            # startup and a full collection would walk the whole heap
+            gc.collect(generation=0)
+            global current_name, current_device
+            current_device = device
+            current_name = benchmark.name
+            yield device, current_name, benchmark, lazy_benchmark
+        except Exception:
+            logging.exception(f"Loading benchmark failed: {name}")
+
+
+def make_caller(model, inputs):
+    """Resolve the calling convention for `inputs` once, returning a
+    zero-arg closure, so benchmark loops don't re-run the isinstance
+    chain on every iteration."""
+    if isinstance(inputs, (tuple, list)):
+        return lambda: model(*inputs)
+    elif isinstance(inputs, dict):
+        return lambda: model(**inputs)
+    elif isinstance(inputs, torch.Tensor):
+        return lambda: model(inputs)
+    raise RuntimeError("invalid example inputs ", inputs)
+
+
+def call_model_with(model, inputs):
+    return make_caller(model, inputs)()
+
+
+class NoOpSync:
+    """Syncer that does nothing; used when timing pure host-side (dispatch or
+    lazy trace) overhead, where any device wait would pollute the number."""
+
+    def iter_sync(self, results):
+        pass
+
+    def final_sync(self, results):
+        pass
+
+    def use_cuda_events(self):
+        return False
+
+
+class CudaSync:
+    """Syncer for eager cuda benchmarks."""
+
+    def __init__(self, sync_every_iter=False):
+        self.sync_every_iter = sync_every_iter
+
+    def iter_sync(self, results):
+        if self.sync_every_iter:
+            torch.cuda.synchronize()
+
+    def final_sync(self, results):
+        torch.cuda.synchronize()
+
+    def event_final_sync(self, results, event):
+        # record+synchronize waits only on the current stream, where
+        # torch.cuda.synchronize() stalls every stream on the device
+        event.record()
+        event.synchronize()
+
+    def use_cuda_events(self):
+        return torch.cuda.is_available()
+
+
+class LazySync:
+    """Syncer for lazy benchmarks: mark_step hands the traced graph off for
+    execution, wait_device_ops blocks until the backend has drained."""
+
+    def __init__(self, sync_every_iter=False, skip_final_sync=False):
+        self.sync_every_iter = sync_every_iter
+        self.skip_final_sync = skip_final_sync
+
+    def iter_sync(self, results):
+        ltm.mark_step()
+        if self.sync_every_iter:
+            ltm.wait_device_ops()
+            if current_device == "cuda":
+                torch.cuda.synchronize()
+
+    def final_sync(self, results):
+        ltm.mark_step()
+        if self.skip_final_sync:
+            return
+        ltm.wait_device_ops()
+        if current_device == "cuda":
+            torch.cuda.synchronize()
+
+    def event_final_sync(self, results, event):
+        ltm.mark_step()
+        ltm.wait_device_ops()
+        # narrower than torch.cuda.synchronize(): wait_device_ops has already
+        # drained the backend, the event only covers this stream's tail
+        event.record()
+        event.synchronize()
+
+    def use_cuda_events(self):
+        return current_device == "cuda" and not self.skip_final_sync
+
+
+class ToDeviceSync:
+    """Syncer that forces materialization by moving results to `device`;
+    the only way to 'sync' a lazy benchmark running on a cpu backend."""
+
+    def __init__(self, device, sync_every_iter=False):
+        self.device = device
+        self.sync_every_iter = sync_every_iter
+
+    def iter_sync(self, results):
+        if self.sync_every_iter:
+            to_device(results[-1], self.device)
+            if current_device == "cuda":
+                torch.cuda.synchronize()
+
+    def final_sync(self, results):
+        if len(results):
+            if self.sync_every_iter:
+                to_device(results[-1], self.device)
+            else:
+                to_device(results, self.device)
+        if current_device == "cuda":
+            torch.cuda.synchronize()
+
+    def use_cuda_events(self):
+        return False
+
+
+# counter values at the last snapshot_lazy_metrics() call
+_counter_snapshot = {}
+
+
+def _all_counters():
+    # a single pybind crossing when the backend exposes a bulk fetch;
+    # otherwise one counter_value call per name through a hoisted local
+    bulk = getattr(lazy_tensor_core._LAZYC, "_ltc_get_all_counters", None)
+    if bulk is not None:
+        return {name: int(value) for name, value in bulk().items()}
+    cv = metrics.counter_value
+    return {name: int(cv(name)) for name in metrics.counter_names()}
+
+
+def snapshot_lazy_metrics():
+    global _counter_snapshot
+    _counter_snapshot = _all_counters()
+
+
+def dump_lazy_metrics():
+    """Counter deltas since the last snapshot_lazy_metrics() call.
+
+    Diffing against a snapshot instead of reset_metrics() + fresh read
+    saves the reset FFI hop and leaves the counters intact for anything
+    else that inspects them.
+    """
+    base = _counter_snapshot
+    return {name: value - base.get(name, 0)
+            for name, value in _all_counters().items()
+            if value - base.get(name, 0) > 0}
+
+
+def to_device(tensors, device):
+    """Handles moving tensor or tensors (in various containers) to a new
+    device. Used for correctness checking, and as an impromptu means of
+    synchronization. Note: this method doesn't apply a cuda sync, do that
+    outside.
+    """
+    try:
+        import transformers.modeling_outputs
+        if (
+            isinstance(tensors, transformers.modeling_outputs.MaskedLMOutput)
+            or isinstance(tensors, transformers.modeling_outputs.Seq2SeqLMOutput)
+        ):
+            # huggingface transformers return classes as model output with many
+            # attributes we don't want to sync (such as hidden states of every
+            # layer) - just sync the logits
+            tensors = tensors.logits
+    except ImportError:
+        pass
+
+    # tree_map flattens once and rebuilds from a cached spec, instead of
+    # recursing through the containers with a Python frame per level.
+    # non_blocking lets the copies overlap with subsequent dispatch; callers
+    # that need the data on the host are responsible for the cuda sync.
+    def _move(t):
+        if not isinstance(t, torch.Tensor):
+            return t
+        if device == "cpu" and t.is_cuda:
+            # a non_blocking D2H copy only overlaps if the destination is
+            # pinned; into pageable memory the driver stalls the CPU anyway
+            dst = torch.empty_like(t, device="cpu", pin_memory=True)
+            dst.copy_(t, non_blocking=True)
+            return dst
+        if t.device.type == "cpu" and device == "cuda":
+            return t.pin_memory().to(device, non_blocking=True)
+        return t.to(device, non_blocking=True)
+
+    return tree_map(_move, tensors)
+
+
+def check_results(name, correct_result, lazy_result, device):
+    # materialize the lazy graph before moving anything across devices
+    ltm.wait_device_ops()
+    if device == "cuda":
+        # compare on the device: allclose becomes a single reduce kernel
+        # returning a scalar, instead of two full D2H copies followed by a
+        # host-side sweep over both tensors
+        correct_result = to_device(correct_result, "cuda")
+        lazy_result = to_device(lazy_result, "cuda")
+        return torch.allclose(correct_result, lazy_result)
+    correct_result = to_device(correct_result, device)
+    lazy_result = to_device(lazy_result, device)
+    if torch.cuda.is_available():
+        # to_device copies are async; wait before comparing on the host
+        torch.cuda.synchronize()
+    return torch.allclose(correct_result, lazy_result)
+
+
+def check_eval_correctness(args, benchmark, lazy_benchmark, name):
+    try:
+        set_seeds()
+        model, example_inputs = benchmark.get_module()
+        correct_result = call_model_with(model, example_inputs)
+        set_seeds()
+        lazy_model, lazy_inputs = lazy_benchmark.get_module()
+        lazy_result = call_model_with(lazy_model, lazy_inputs)
+        if not check_results(name, correct_result, lazy_result, args.device):
+            print(f"INCORRECT: {name}")
+            return False
+    except Exception:
+        logging.exception(f"Correctness check failed: {name}")
+        return False
+    return True
+
+
+def _cuda_graph_for_eval(benchmark, model, example_inputs, times):
+    """Capture `times` eval iterations into a single CUDA graph.
+
+    Replaying the graph is one launch instead of `times` Python dispatches,
+    so the eager cuda reference measures kernel time rather than dispatch
+    overhead. Only valid because eval benchmarks keep static example_inputs
+    on the benchmark object; capture failures (dynamic shapes, control
+    flow, unsupported ops) fall back to the dispatch loop.
+
+    The graph (None if capture failed) is cached on the benchmark object
+    itself: a module-level cache keyed on id() could hand a later model a
+    stale graph once CPython recycles the freed benchmark's id, and would
+    pin every capture plus its output buffers for the whole run instead of
+    releasing them with the model.
+    """
+    cached = getattr(benchmark, "_cuda_graph", None)
+    if cached is not None and cached[0] == times:
+        return cached[1]
+    try:
+        caller = make_caller(model, example_inputs)
+        # warm up on a side stream so lazy allocator/cudnn setup isn't
+        # baked into the capture
+        s = torch.cuda.Stream()
+        s.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(s):
+            for _ in range(3):
+                caller()
+        torch.cuda.current_stream().wait_stream(s)
+        g = torch.cuda.CUDAGraph()
+        results = []
+        with torch.cuda.graph(g):
+            for i in range(times):
+                results.append(caller())
+        graph = (g, results)
+    except Exception:
+        logging.exception(f"CUDA graph capture failed: {current_name}")
+        graph = None
+    benchmark._cuda_graph = (times, graph)
+    return graph
+
+
+def timed(args, benchmark, sync, times=1):
+    results = []
+    sync.final_sync(results)
+    set_seeds()
+    if args.test == "eval":
+        model, example_inputs = benchmark.get_module()
+        caller = make_caller(model, example_inputs)
+
+    # the eager cuda reference of the compute experiment replays a
+    # pre-captured graph of the whole inner loop. Gated on CudaSync so the
+    # overhead experiment's NoOpSync reference still measures `times` real
+    # Python dispatches, and skipped when syncing every iteration, since a
+    # replay has no per-iteration boundary to sync at
+    graph = None
+    if (
+        args.test == "eval"
+        and benchmark.device == "cuda"
+        and isinstance(sync, CudaSync)
+        and not sync.sync_every_iter
+        # the times=1 warmup calls aren't worth a capture of their own
+        and times > 1
+    ):
+        graph = _cuda_graph_for_eval(benchmark, model, example_inputs, times)
+
+    # error on accidental syncs in the lazy path; opt-in since flipping the
+    # mode takes a driver mutex on every timed run and would touch the cuda
+    # runtime even on cpu-only hosts
+    sync_debug = (
+        args.sync_debug
+        and benchmark.device == "lazy"
+        and torch.cuda.is_available()
+    )
+    if sync_debug:
+        torch.cuda.set_sync_debug_mode(2)
+
+    # cuda events wait only on the stream they were recorded on, rather than
+    # stalling the whole device (and any concurrent work) the way a full
+    # torch.cuda.synchronize() bracket around perf_counter would
+    cuda_events = sync.use_cuda_events()
+    if cuda_events:
+        start_event = torch.cuda.Event(enable_timing=True)
+        end_event = torch.cuda.Event(enable_timing=True)
+        start_event.record()
+    else:
+        t0 = time.perf_counter()
+    if graph is not None:
+        g, results = graph
+        g.replay()
+    else:
+        for i in range(times):
+            if args.test == "eval":
+                out = caller()
+                # sync (may be just an async 'mark_step' for lazy, or no-op
+                # for cuda) with the fresh output as witness, then drop the
+                # previous one: only the live output has to survive until
+                # final_sync, so peak memory stays at one output instead of
+                # times x output and the allocator can reuse the freed blocks
+                sync.iter_sync([out])
+                results[:] = (out,)
+            elif args.test == "train":
+                benchmark.train()
+                # may be just an async 'mark_step' for lazy, or no-op for cuda
+                sync.iter_sync(results)
+    if sync_debug:
+        torch.cuda.set_sync_debug_mode(0)
+    # should be a hard sync for lazy and cuda, unless strictly measuring
+    # lazy trace overhead, then no-op
+    if cuda_events:
+        sync.event_final_sync(results, end_event)
+        return results, start_event.elapsed_time(end_event) / 1000.0
+    sync.final_sync(results)
+    t1 = time.perf_counter()
+    return results, t1 - t0
+
+
+def _cuda_graph_for_lazy(lazy_benchmark, times):
+    """Capture the steady-state lazy inner loop into a CUDA graph.
+
+    Once the lazy compile cache is warm (the invariant
+    lazy_compute_experiment checks via the CachedCompile counter),
+    mark_step launches an identical kernel sequence every iteration, so
+    the launch cost of its many small ops can be collapsed into a single
+    cudaGraphLaunch. No host-side waits are allowed inside capture, so the
+    loop is inlined here rather than reusing timed().
+
+    mark_step is an asynchronous hand-off to the lazy executor thread, so
+    depending on the backend the kernels may be launched after the capture
+    region has closed, yielding a graph that "successfully" captured
+    nothing. Replays of the capture are therefore sanity-checked before
+    use, and the whole path is opt-in via --lazy_cuda_graph.
+    """
+    try:
+        model, example_inputs = lazy_benchmark.get_module()
+        caller = make_caller(model, example_inputs)
+        s = torch.cuda.Stream()
+        s.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(s):
+            # settle lazy compilation and allocator pools before capture
+            for i in range(3):
+                caller()
+                ltm.mark_step()
+            ltm.wait_device_ops()
+        torch.cuda.current_stream().wait_stream(s)
+        g = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(g, stream=s):
+            for i in range(times):
+                caller()
+                ltm.mark_step()
+        # an empty graph replays in roughly the bare cudaGraphLaunch cost
+        # (single-digit us); reject anything in that range rather than
+        # silently timing nothing. Tiny models may be rejected too, which
+        # just means they keep using the traced path.
+        replay_time = min(timed_cuda_graph_replay(g) for _ in range(3))
+        if replay_time < 20e-6:
+            print(f"WARNING: lazy CUDA graph replay for {current_name} "
+                  f"took {replay_time * 1e6:.1f}us; capture is likely "
+                  "empty, using the traced path")
+            return None
+        return g
+    except Exception:
+        logging.exception(f"lazy CUDA graph capture failed: {current_name}")
+        return None
+
+
+def timed_cuda_graph_replay(graph):
+    start_event = torch.cuda.Event(enable_timing=True)
+    end_event = torch.cuda.Event(enable_timing=True)
+    start_event.record()
+    graph.replay()
+    end_event.record()
+    end_event.synchronize()
+    return start_event.elapsed_time(end_event) / 1000.0
+
+
+def lazy_overhead_experiment(args, results, benchmark, lazy_benchmark):
+    ref_times, lazy_times = [], []
+    warmup0 = time.perf_counter()
+    for rep in range(args.warmup):
+        # interleave the runs to handle frequency scaling and load changes
+        timed(args, benchmark, sync=NoOpSync())
+        timed(args, lazy_benchmark, sync=LazySync(skip_final_sync=True))
+        ltm.wait_device_ops()
+    warmup_time = time.perf_counter() - warmup0
+    bench0 = time.perf_counter()
+    snapshot_lazy_metrics()
+    for rep in range(args.repeat):
+        # interleave the runs to handle frequency scaling and load changes
+        _, ref_time = timed(args, benchmark, sync=NoOpSync())
+        _, lazy_time = timed(
+            args, lazy_benchmark, sync=LazySync(skip_final_sync=True))
+        ref_times.append(ref_time)
+        lazy_times.append(lazy_time)
+        # mark_step has been called by LazySync, so the pending graph is
+        # behind us; wait so the next rep doesn't overlap this one
+        ltm.wait_device_ops()
+    lazy_metrics = dump_lazy_metrics()
+    bench_time = time.perf_counter() - bench0
+    pvalue = welch_ttest(ref_times, lazy_times)
+    median = (statistics.median(ref_times), statistics.median(lazy_times))
+    fallbacks = ";".join(
+        [f"{m}:{lazy_metrics[m]}" for m in lazy_metrics if "aten::" in m])
+    ops = int(sum(
+        [lazy_metrics[m] for m in lazy_metrics
+         if "lazy::" in m or "aten::" in m]) / args.repeat)
+    trace_us = median[1] / 1e-6
+    us_per_op = trace_us / max(ops, 1)
+    overhead = median[1] / median[0]
+    results.append(overhead)
+    output_csv(
+        os.path.join(
+            args.output_dir,
+            f"lazy-overheads_{args.test}_{get_unique_suffix()}.csv"),
+        ("dev", "name", "test", "overhead", "pvalue", "ops", "trace_us",
+         "us_per_op", "fallbacks"),
+    ).writerow([
+        current_device, current_name, args.test, f"{overhead:.4f}",
+        f"{pvalue:.4e}", f"{ops}", f"{trace_us:.4f}", f"{us_per_op:.4f}",
+        f"{fallbacks}"])
+    print(f"{short_name(current_name, limit=30):<30} {current_device:<4} "
+          f"{args.test:<5} {'trace overheads':<20} "
+          f"overhead: {overhead:.3f} pvalue: {pvalue:.2e} "
+          f"ops: {ops} trace_us: {trace_us:.3f} us_per_op: {us_per_op:.3f}")
+    if args.verbose:
+        print(f"CIDEBUGOUTPUT,lazy_overhead_experiment,"
+              f"{current_name},{args.test},{current_device},{overhead:.4f},"
+              f"{pvalue:.4e},{args.warmup},{args.repeat},"
+              f"{warmup_time:.2f},{bench_time:.2f}")
+    return (overhead, pvalue)
+
+
+def lazy_compute_experiment(
+        args, experiment, results, benchmark, lazy_benchmark,
+        sync_every_iter=False):
+    ref_times, lazy_times = [], []
+    if current_device == "cuda":
+        ref_sync = CudaSync(sync_every_iter=sync_every_iter)
+        lazy_sync = LazySync(sync_every_iter=sync_every_iter)
+    else:
+        ref_sync = NoOpSync()
+        lazy_sync = ToDeviceSync(
+            current_device, sync_every_iter=sync_every_iter)
+
+    # interleave the runs to handle frequency scaling and load changes
+    warmup0 = time.perf_counter()
+    for rep in range(args.warmup):
+        # warmup
+        timed(args, benchmark, sync=ref_sync)
+        timed(args, lazy_benchmark, sync=lazy_sync)
+    warmup_time = time.perf_counter() - warmup0
+
+    # with a warm compile cache, mark_step launches the same kernels every
+    # iteration, so the whole lazy inner loop can be replayed as a single
+    # graph launch instead of a launch per small op; opt-in because not
+    # every lazy backend launches its kernels inside the capture region
+    lazy_graph = None
+    if (args.lazy_cuda_graph and current_device == "cuda"
+            and args.test == "eval" and not sync_every_iter):
+        lazy_graph = _cuda_graph_for_lazy(
+            lazy_benchmark, args.inner_loop_repeat)
+
+    # fresh metrics for each timed run
+    snapshot_lazy_metrics()
+    bench0 = time.perf_counter()
+    for rep in range(args.repeat):
+        # measure
+        _, ref_time = timed(
+            args, benchmark, times=args.inner_loop_repeat, sync=ref_sync)
+        if lazy_graph is not None:
+            lazy_time = timed_cuda_graph_replay(lazy_graph)
+        else:
+            _, lazy_time = timed(
+                args, lazy_benchmark, times=args.inner_loop_repeat,
+                sync=lazy_sync)
+        ref_times.append(ref_time)
+        lazy_times.append(lazy_time)
+    bench_time = time.perf_counter() - bench0
+    lazy_metrics = dump_lazy_metrics()
+    # graph replays don't retrace, so the compile counter only means
+    # something when the lazy side actually ran through the tracer
+    if lazy_graph is None and (
+            "CachedCompile" not in lazy_metrics
+            or lazy_metrics["CachedCompile"] != args.repeat * args.inner_loop_repeat):
+        print("WARNING: lazy cached compile count indicates fallbacks, "
+              "or something else")
+    fallbacks = {k: v for (k, v) in lazy_metrics.items() if "aten::" in k}
+    if len(fallbacks):
+        print(f"WARNING: lazy-eager fallbacks detected for [{fallbacks}]")
+    if args.dump_lazy_counters:
+        print(lazy_metrics)
+    pvalue = welch_ttest(ref_times, lazy_times)
+    median = (statistics.median(ref_times), statistics.median(lazy_times))
+    speedup = median[0] / median[1]
+    results.append(speedup)
+    output_csv(
+        os.path.join(
+            args.output_dir,
+            f"lazy-compute_{args.test}_{get_unique_suffix()}.csv"),
+        ("name", "dev", "experiment", "test", "speedup", "pvalue"),
+    ).writerow([
+        current_name, current_device, experiment, args.test,
+        f"{speedup:.4f}", f"{pvalue:.2e}"])
+    print(f"{short_name(current_name, limit=30):<30} {current_device:<4} "
+          f"{args.test:<5} {experiment:<20} speedup: {speedup:.3f} "
+          f"pvalue: {pvalue:.2e}")
+    if args.verbose:
+        print(f"CIDEBUGOUTPUT,lazy_compute_experiment,"
+              f"{current_name},{current_device},{experiment},{args.test},"
+              f"{speedup:.4f},{pvalue:.2e},{args.warmup},{args.repeat},"
+              f"{warmup_time:.2f},{bench_time:.2f}")
+    return (speedup, pvalue)
+
+
+def run_tracing_execute_noops(test, lazy_benchmark, trace_batch=1):
+    """Run the tracing portion only, with the noop backend, so a profiler
+    run on top of this sees just the lazy trace overhead.
+
+    trace_batch controls how many forward passes run between mark_step
+    calls: 1 isolates per-op tracing plus graph hand-off, larger values
+    let the IR graph grow the way real workloads (which don't mark_step
+    every op) do, separating per-op trace cost from mark_step cost.
+    """
+    ltm.set_noop_execution_mode(True)
+    if test == "eval":
+        model, example_inputs = lazy_benchmark.get_module()
+        caller = make_caller(model, example_inputs)
+    # doesn't actually collect a profile, but runs just the lazy trace
+    # so you can use a profiler on top of the program
+    for i in range(300 // trace_batch):
+        for j in range(trace_batch):
+            if test == "eval":
+                results = caller()
+            elif test == "train":
+                lazy_benchmark.train()
+        # mark_step() avoids accumulating too much in-memory IR
+        ltm.mark_step()
+    ltm.set_noop_execution_mode(False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--filter", "-k", action="append", default=[],
+        help="filter benchmarks")
+    parser.add_argument(
+        "--exclude", "-x", action="append", default=[],
+        help="filter out benchmarks")
+    parser.add_argument(
+        "--device", "-d", default="cuda", help="cpu or cuda")
+    parser.add_argument(
+        "--warmup", type=int, default=4, help="number of warmup runs")
+    parser.add_argument(
+        "--repeat", "-n", type=int, default=6,
+        help="number of timing runs (samples)")
+    parser.add_argument(
+        "--inner_loop_repeat", type=int, default=10,
+        help="repeat the computation this many times per sample")
+    parser.add_argument(
+        "--fuser", type=str, default="fuser2",
+        choices=["fuser0", "fuser1", "fuser2"],
+        help="0=legacy, 1=nnc, 2=nvfuser")
+    parser.add_argument(
+        "--test", type=str, default="eval", choices=["eval", "train"])
+    parser.add_argument(
+        "--verbose", action="store_true")
+    parser.add_argument(
+        "--torchbench_dir", type=str,
+        help="path to the torchbenchmark repo checkout")
+    parser.add_argument(
+        "--output_dir", type=str, default=".",
+        help="directory to write csv output to")
+    parser.add_argument(
+        "--dump_lazy_counters", action="store_true",
+        help="print lazy counter values after each timing run")
+    parser.add_argument(
+        "--sync_debug", action="store_true",
+        help="error on any cuda sync inside the timed lazy region")
+    parser.add_argument(
+        "--flush_every", type=int, default=64,
+        help="flush csv output every N rows")
+    parser.add_argument(
+        "--lazy_cuda_graph", action="store_true",
+        help="measure the lazy side of the compute experiment as a CUDA "
+             "graph replay; only meaningful when the backend launches its "
+             "kernels synchronously inside mark_step")
+    parser.add_argument(
+        "--run_tracing_execute_noops", action="store_true",
+        help="run the tracing portion only, with the noop backend, useful "
+             "for running under a profiler")
+    parser.add_argument(
+        "--trace_batch", type=int, default=1,
+        help="forward passes to trace between mark_steps in "
+             "--run_tracing_execute_noops mode")
+    args = parser.parse_args()
+
+    csv_flush_every = args.flush_every
+    results = []
+
+    torchbench_dir = abspath(
+        args.torchbench_dir if args.torchbench_dir else "../../../benchmark")
+    if exists(torchbench_dir):
+        sys.path.append(torchbench_dir)
+
+    # pay the one-time setup costs up front rather than letting the first
+    # model's warmup absorb them: cuda context creation is ~1-2s of
+    # cudaMalloc/cudaFree, and the first scripted run primes the fuser
+    def _prime(x):
+        return x + 1
+
+    prime_cuda = args.device == "cuda" and torch.cuda.is_available()
+    if prime_cuda:
+        torch.cuda.init()
+        # round-trip one element to force context + allocator creation
+        torch.empty(1, device="cuda").cpu()
+    prime_input = torch.zeros(1, device="cuda" if prime_cuda else "cpu")
+    with torch.jit.fuser(args.fuser):
+        primed = torch.jit.script(_prime)
+        # profiling executor needs a few runs before it attempts fusion
+        for _ in range(3):
+            primed(prime_input)
+    # the first benchmark's warmup no longer needs to absorb these
+    # one-time costs
+    args.warmup = max(1, args.warmup - 1)
+
+    # everything allocated so far (modules, toy benchmark list, skip sets)
+    # lives for the whole run; moving it to the permanent generation keeps
+    # the per-model collections from re-walking it, which after loading a
+    # large model can cost hundreds of ms per gc.collect()
+    gc.collect()
+    gc.freeze()
+
+    for device, name, benchmark, lazy_benchmark in iter_models(args):
+        if args.run_tracing_execute_noops:
+            run_tracing_execute_noops(
+                args.test, lazy_benchmark, args.trace_batch)
+            continue
+        if args.test == "eval":
+            if not check_eval_correctness(args, benchmark, lazy_benchmark, name):
+                continue
+        with torch.jit.fuser(args.fuser):
+            lazy_overhead_experiment(args, results, benchmark, lazy_benchmark)
+            lazy_compute_experiment(
+                args, f"amortized {args.inner_loop_repeat}x", results,
+                benchmark, lazy_benchmark)
+            lazy_compute_experiment(
+                args, "unamortized", results, benchmark, lazy_benchmark,
+                sync_every_iter=True)
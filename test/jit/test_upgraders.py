@@ -16,36 +16,37 @@ if __name__ == '__main__':
                        "instead.")
 
 class TestUpgraders(JitTestCase):
-    def test_populated_upgrader_graph(self):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # scripting and serializing the function is the slow part of these
+        # tests; do it once and let each test reload from the saved bytes
         @torch.jit.script
         def f():
             return 0
 
         buffer = io.BytesIO()
         torch.jit.save(f, buffer)
-        buffer.seek(0)
-        torch.jit.load(buffer)
+        cls._simple_buffer_bytes = buffer.getvalue()
+
+    def _load_simple_function(self):
+        return torch.jit.load(io.BytesIO(self._simple_buffer_bytes))
+
+    def test_populated_upgrader_graph(self):
+        self._load_simple_function()
         upgraders_size = torch._C._get_upgraders_map_size()
         upgraders_dump = torch._C._dump_upgraders_map()
         # make sure we only populate the upgrader map only once
         # so we load it again and make sure the upgrader map has
         # same content
-        buffer.seek(0)
-        torch.jit.load(buffer)
+        self._load_simple_function()
         upgraders_size_second_time = torch._C._get_upgraders_map_size()
         upgraders_dump_second_time = torch._C._dump_upgraders_map()
         self.assertTrue(upgraders_size == upgraders_size_second_time)
         self.assertTrue(upgraders_dump == upgraders_dump_second_time)
 
     def test_populated_test_upgrader_graph(self):
-        @torch.jit.script
-        def f():
-            return 0
-
-        buffer = io.BytesIO()
-        torch.jit.save(f, buffer)
-        buffer.seek(0)
-        torch.jit.load(buffer)
+        self._load_simple_function()
 
         # upgrader map should have populated now
         upgraders_size = torch._C._get_upgraders_map_size()